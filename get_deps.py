@@ -1,11 +1,15 @@
 # .github/scripts/full_dependency_test_runner.py
 import ast
+import functools
 import os
+import pickle
+import re
 import subprocess
 import sys
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import Dict, FrozenSet, List, Optional, Set
 
 try:
     from importlib import metadata
@@ -13,247 +17,850 @@ except ImportError:
     # Fallback for older Python versions
     pass  # type: ignore
 
+try:
+    import pygit2
+except ImportError:
+    # Optional: used to diff in-process instead of shelling out to git
+    pygit2 = None
+
+try:
+    import numpy as np
+except ImportError:
+    # Optional: closures fall back to Python sets without it
+    np = None
+
+try:
+    import re2
+except ImportError:
+    # Optional: DFA-based regex engine for the test-file pattern
+    re2 = None
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import connected_components
+except ImportError:
+    # Optional: SCC detection falls back to the pure-Python Tarjan pass
+    csr_matrix = None
+
+# Bump whenever the cached import format or extraction logic changes
+CACHE_VERSION = 4
+CACHE_DIR_NAME = ".deps_cache"
+CACHE_FILE_NAME = "raw_imports.pickle"
+
+# Parsing a handful of files is cheaper than spinning up worker processes
+PARALLEL_MIN_FILES = 50
+
+# Collapse a directory's tests into the directory itself once the selection
+# covers at least this share of the known test files under it
+ARGV_COLLAPSE_THRESHOLD = 0.9
+
+# Directory names never descended into during the project scan
+SKIP_DIRS = frozenset({"venv", ".venv", "build", "dist", ".git", "__pycache__", "node_modules", CACHE_DIR_NAME})
+
+# Standard library module names, snapshotted once (Python 3.10+)
+STDLIB_MODULES = frozenset(sys.stdlib_module_names)
+
+# One linear scan over the path instead of four substring checks; tests?/ is
+# anchored to a component boundary so top-level tests/ matches too
+_TEST_FILE_PATTERN = r"(?:^|/)tests?/|test_|_test\.py$"
+_TEST_FILE_RE = (re2 or re).compile(_TEST_FILE_PATTERN)
+
+# Any import-looking statement, including ones tucked into compound lines
+# ('x = 1; import y', 'if cond: import y'); used to decide whether a file has
+# imports beyond its prelude (and so needs a full parse)
+_IMPORT_BODY_RE = re.compile(r"(?:^|[;:])[ \t]*(?:import|from)[ \t]", re.MULTILINE)
+
+
+@functools.cache
+def _get_installed_packages() -> FrozenSet[str]:
+    """Get all installed package names using importlib.metadata.
+
+    Enumerating distributions walks every sys.path entry, which is slow on
+    fat environments — cache it at module scope so constructing several
+    analyzers in one process (e.g. under tests) pays the cost once.
+    """
+    try:
+        # Get all installed distributions and extract their names
+        return frozenset(dist.metadata["name"].lower() for dist in metadata.distributions())
+    except Exception:
+        # Fallback to empty set if metadata access fails
+        return frozenset()
+
+
+def _scan_nested_enabled() -> bool:
+    """Whether imports nested in function/class bodies are scanned."""
+    return bool(os.environ.get("DEPS_SCAN_NESTED_IMPORTS"))
+
+
+class _ImportCollector(ast.NodeVisitor):
+    """Collect raw (module, level) import statements in one targeted pass.
+
+    Unlike ast.walk, which touches every node in the tree, this only
+    descends through statement context and by default stops at function and
+    class bodies, where imports are deferred until call time anyway. Set
+    DEPS_SCAN_NESTED_IMPORTS=1 to scan those bodies too if a project leans
+    heavily on lazy imports.
+    """
+
+    def __init__(self, scan_nested: bool = False):
+        self.raw_imports: Set[tuple] = set()
+        self._scan_nested = scan_nested
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.raw_imports.add((alias.name, 0))
+
+    def visit_ImportFrom(self, node):
+        if node.module:
+            self.raw_imports.add((node.module, node.level))
+        elif node.level > 0:  # from . import something
+            self.raw_imports.add(("", node.level))
+
+    def visit_FunctionDef(self, node):
+        if self._scan_nested:
+            self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_ClassDef = visit_FunctionDef
+
+
+def _parse_import_line(stripped: str, raw_imports: Set[tuple]) -> Optional[int]:
+    """Parse one unindented import statement into raw_imports.
+
+    Returns the open-paren depth left by the line (so the caller can skip
+    continuation lines of a parenthesized from-import), or None when the
+    line uses a form the fast scanner does not handle.
+    """
+    comment = stripped.find("#")
+    if comment != -1:
+        stripped = stripped[:comment].rstrip()
+    if ";" in stripped or stripped.endswith("\\"):
+        return None
+
+    if stripped.startswith("import "):
+        for segment in stripped[7:].split(","):
+            tokens = segment.split()
+            if not tokens:
+                return None
+            raw_imports.add((tokens[0], 0))
+        return 0
+
+    # from <target> import <names>
+    target, _, imported = stripped[5:].partition(" import ")
+    if not imported:
+        return None
+    target = target.strip()
+    level = len(target) - len(target.lstrip("."))
+    module = target[level:]
+    if (not module and level == 0) or " " in module:
+        return None
+    raw_imports.add((module, level))
+    return imported.count("(") - imported.count(")")
+
+
+def _fast_scan_imports(source: bytes) -> Optional[Set[tuple]]:
+    """Collect imports from a module prelude without building an AST.
+
+    Handles the overwhelmingly common layout — an optional docstring,
+    comments and unindented imports at the top of the file — and returns
+    None whenever the cheap path cannot be trusted: an import appearing
+    after the prelude or at indentation (conditional and lazy imports),
+    continuations or compound lines, or bytes the quick decode rejects.
+    The caller falls back to a full parse in that case.
+    """
+    try:
+        text = source.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return None
+
+    raw_imports: Set[tuple] = set()
+    lines = text.split("\n")
+    index = 0
+    total = len(lines)
+    while index < total:
+        line = lines[index]
+        stripped = line.strip()
+        index += 1
+        if not stripped or stripped.startswith("#"):
+            continue
+        if stripped.startswith(('"""', "'''")):
+            quote = stripped[:3]
+            closer = stripped.find(quote, 3)
+            if closer == -1:
+                # Multi-line docstring: skip to the closing line
+                while index < total:
+                    body = lines[index]
+                    closer = body.find(quote)
+                    index += 1
+                    if closer != -1:
+                        if body[closer + 3:].strip():
+                            return None
+                        break
+            elif stripped[closer + 3:].strip():
+                return None
+            continue
+        if stripped.startswith(("'", '"')):
+            # Single-quoted docstring; anything fancier than one plain
+            # string on the line is not worth handling here
+            if len(stripped) < 2 or stripped[-1] != stripped[0] or ";" in stripped:
+                return None
+            continue
+        if stripped.startswith(("import ", "from ")):
+            if line[0] in " \t":
+                return None
+            depth = _parse_import_line(stripped, raw_imports)
+            if depth is None:
+                return None
+            while index < total and depth > 0:
+                # Strip trailing comments so a stray '(' in one cannot keep
+                # the depth positive and swallow the rest of the file
+                body = lines[index]
+                comment = body.find("#")
+                if comment != -1:
+                    body = body[:comment]
+                depth += body.count("(") - body.count(")")
+                index += 1
+            if depth > 0:
+                return None
+            continue
+        # First real statement: the prelude is over
+        index -= 1
+        break
+
+    # Only trust the scan if no import can occur later in the file;
+    # otherwise the visitor would have found more than we did
+    if _IMPORT_BODY_RE.search("\n".join(lines[index:])):
+        return None
+    return raw_imports
+
+
+def _parse_raw_imports(full_path: str, rel_path: str) -> Set[tuple]:
+    """Parse a Python file into raw (module, level) import statements."""
+    collector = _ImportCollector(scan_nested=_scan_nested_enabled())
+    try:
+        # Read bytes: the tokenizer decodes the source itself (honoring any
+        # coding cookie), so a text-mode read would decode everything twice
+        with open(full_path, "rb") as f:
+            source = f.read()
+
+        # Most files keep all their imports in the prelude; a line scan
+        # covers those for a fraction of the cost of building an AST
+        raw_imports = _fast_scan_imports(source)
+        if raw_imports is not None:
+            return raw_imports
+
+        tree = compile(source, rel_path, "exec", flags=ast.PyCF_ONLY_AST, dont_inherit=True, optimize=0)
+        collector.visit(tree)
+
+    except Exception as e:
+        print(f"Warning: Could not parse {rel_path}: {e}")
+
+    return collector.raw_imports
+
+
+def _extract_raw_imports(args: tuple) -> "tuple[str, Set[tuple]]":
+    """Extract a single file's raw imports.
+
+    Module-level so it can run in worker processes; returns
+    (rel_path, {(module, level), ...}) with level 0 for absolute imports.
+    """
+    rel_path, project_root = args
+    return rel_path, _parse_raw_imports(os.path.join(project_root, rel_path), rel_path)
+
 
 class FullDependencyAnalyzer:
     def __init__(self, project_root: Path = Path(".")):
         self.project_root = project_root
-        self.dependency_graph: Dict[str, Set[str]] = defaultdict(set)
-        self.reverse_graph: Dict[str, Set[str]] = defaultdict(set)
-        self.module_to_tests: Dict[str, Set[str]] = defaultdict(set)
+        # Graphs are keyed on small-int file ids (see _names/_ids below):
+        # int hashing and set ops are much cheaper than on repeated path strings
+        self.dependency_graph: Dict[int, Set[int]] = defaultdict(set)
+        self.reverse_graph: Dict[int, Set[int]] = defaultdict(set)
+        self.module_to_tests: Dict[int, Set[int]] = defaultdict(set)
         self._python_files: Set[str] = set()
+        self._test_files: Set[str] = set()
+        self._test_ids: Set[int] = set()
+        self._top_level_project_modules: Set[str] = set()
+
+        # Intern table: each path gets one id; _names[id] recovers the path
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+
+        # Module-part tuples -> file id, for O(1) import resolution
+        self._file_by_module: Dict[tuple, int] = {}
+        self._pkg_by_module: Dict[tuple, int] = {}
+        self._file_parts: Dict[str, tuple] = {}
+
+        # Per-instance memos: module names repeat across files, so classify
+        # and resolve each one at most once
+        self._is_external_module = functools.lru_cache(maxsize=None)(self._is_external_module)
+        self._resolve_import = functools.lru_cache(maxsize=None)(self._resolve_import)
+
+        # Memoized transitive closures; nodes in the same SCC share one value.
+        # With numpy, a closure is a sorted unique int32 array (C-level set
+        # algebra); without it, a frozenset of ids.
+        self._fwd_closure: Dict[int, FrozenSet[int]] = {}
+        self._rev_closure: Dict[int, FrozenSet[int]] = {}
+        self._scc_fwd_closure: Dict[int, FrozenSet[int]] = {}
+        self._scc_rev_closure: Dict[int, FrozenSet[int]] = {}
+        self._empty_closure = np.empty(0, dtype=np.int32) if np is not None else frozenset()
 
         # Cache installed package names for performance
-        self._installed_packages: Set[str] = self._get_installed_packages()
+        self._installed_packages: FrozenSet[str] = _get_installed_packages()
+
+        # On-disk cache of extracted dependencies, keyed by file state
+        self._cache_dir = self.project_root / CACHE_DIR_NAME
 
         # Build the complete dependency graph
         self._scan_project()
+        self._test_ids_array = np.array(sorted(self._test_ids), dtype=np.int32) if np is not None else None
         self._build_dependency_graph()
+        self._compute_sccs()
+        self._compute_forward_closures()
         self._map_tests_to_modules()
 
-    def _get_installed_packages(self) -> Set[str]:
-        """Get a set of all installed package names using importlib.metadata."""
-        try:
-            # Get all installed distributions and extract their names
-            return {dist.metadata["name"].lower() for dist in metadata.distributions()}
-        except Exception:
-            # Fallback to empty set if metadata access fails
-            return set()
+    def _iter_python_files(self):
+        """Walk the project with os.scandir, pruning skipped directories.
+
+        Pruning on descent means virtual environments and build output are
+        never entered at all, instead of being filtered out per file after a
+        full recursive glob.
+        """
+        root = str(self.project_root)
+        stack = [root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in SKIP_DIRS:
+                                stack.append(entry.path)
+                        elif entry.name.endswith(".py"):
+                            yield os.path.relpath(entry.path, root)
+            except OSError:
+                # Unreadable directories are skipped, matching rglob behavior
+                continue
 
     def _scan_project(self):
         """Scan project for all Python files."""
-        for py_file in self.project_root.rglob("*.py"):
-            # Skip virtual environments and build directories
-            if any(skip in str(py_file) for skip in ["venv", ".venv", "build", "dist", ".git", "__pycache__"]):
-                continue
-            self._python_files.add(str(py_file.relative_to(self.project_root)))
+        for rel_path in self._iter_python_files():
+            self._python_files.add(rel_path)
+            # Intern the path; all graph structures use this id
+            file_id = len(self._names)
+            self._ids[rel_path] = file_id
+            self._names.append(rel_path)
+            # Top-level package/module stems, for O(1) external-module checks
+            self._top_level_project_modules.add(rel_path.split("/", 1)[0].removesuffix(".py"))
+            # Index by module parts so import resolution is a dict lookup
+            parts = tuple(rel_path[:-3].split("/"))
+            self._file_parts[rel_path] = parts
+            if parts[-1] == "__init__":
+                self._pkg_by_module[parts[:-1]] = file_id
+            else:
+                self._file_by_module[parts] = file_id
+            # Classify test files once so hot paths can use set membership
+            if self._is_test_file(rel_path):
+                self._test_files.add(rel_path)
+                self._test_ids.add(file_id)
 
     def _build_dependency_graph(self):
         """Build complete forward and reverse dependency graphs."""
-        for py_file in self._python_files:
-            dependencies = self._extract_dependencies(Path(py_file))
-            self.dependency_graph[py_file] = dependencies
+        for py_file, raw_imports in self._collect_raw_imports():
+            file_id = self._ids[py_file]
+            dependencies = self._resolve_raw_imports(py_file, raw_imports)
+            self.dependency_graph[file_id] = dependencies
 
             # Build reverse graph (who depends on this file)
             for dep in dependencies:
-                self.reverse_graph[dep].add(py_file)
-
-    def _extract_dependencies(self, file_path: Path) -> Set[str]:
-        """Extract all dependencies from a Python file."""
-        dependencies = set()
+                self.reverse_graph[dep].add(file_id)
+
+        # Flatten to CSR (offsets + flat indices) for the C-level SCC kernel
+        if np is not None:
+            node_count = len(self._names)
+            indptr = np.zeros(node_count + 1, dtype=np.int64)
+            rows = []
+            for file_id in range(node_count):
+                deps = self.dependency_graph.get(file_id, ())
+                indptr[file_id + 1] = indptr[file_id] + len(deps)
+                rows.append(np.fromiter(deps, dtype=np.int32, count=len(deps)))
+            self._dep_indptr = indptr
+            self._dep_indices = np.concatenate(rows) if rows else np.empty(0, dtype=np.int32)
+
+    def _collect_raw_imports(self) -> List[tuple]:
+        """Return (rel_path, raw imports) for every project file.
+
+        Cache hits are answered from the consolidated cache file with a stat
+        check; only misses are parsed. Parsing is CPU-bound and independent
+        per file, so misses fan out across a process pool; resolution stays
+        on the main process where the lookup tables live. Few misses are
+        parsed serially to avoid pool startup.
+        """
+        cached = self._load_import_cache()
+        project_root = str(self.project_root)
+        file_states: Dict[str, tuple] = {}
+        results: List[tuple] = []
+        misses: List[str] = []
+
+        for py_file in sorted(self._python_files):
+            try:
+                stat = os.stat(os.path.join(project_root, py_file))
+            except OSError:
+                results.append((py_file, set()))
+                continue
+            file_states[py_file] = (stat.st_mtime_ns, stat.st_size)
+            entry = cached.get(py_file)
+            if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                results.append((py_file, entry[2]))
+            else:
+                misses.append(py_file)
+
+        results.extend(self._parse_files(misses, project_root))
+        # A fully warm run has nothing new to persist; rewriting the file
+        # would redo the very serialization the cache exists to avoid. Still
+        # write when the file set shifted so deleted entries get pruned.
+        if misses or file_states.keys() != cached.keys():
+            self._store_import_cache(results, file_states)
+        return results
+
+    def _parse_files(self, misses: List[str], project_root: str) -> List[tuple]:
+        """Parse the given files, in parallel when there are enough of them."""
+        tasks = [(py_file, project_root) for py_file in misses]
+        cpu_count = os.cpu_count() or 1
+
+        if len(tasks) >= PARALLEL_MIN_FILES and cpu_count > 1:
+            try:
+                chunksize = max(1, len(tasks) // (4 * cpu_count))
+                with ProcessPoolExecutor(max_workers=cpu_count) as executor:
+                    return list(executor.map(_extract_raw_imports, tasks, chunksize=chunksize))
+            except Exception as e:
+                # Restricted environments may not allow subprocesses
+                print(f"Warning: Parallel parsing unavailable ({e}), falling back to serial")
+
+        return [_extract_raw_imports(task) for task in tasks]
+
+    def _load_import_cache(self) -> Dict[str, tuple]:
+        """Load the consolidated raw-import cache as path -> (mtime_ns, size, imports).
+
+        The cache is one file holding parallel arrays (structure-of-arrays):
+        file metadata plus all import tuples flattened CSR-style behind an
+        offset array, so a warm run costs a single open + unpickle.
+        """
         try:
-            full_path = self.project_root / file_path
-            with open(full_path, encoding="utf-8") as f:
-                content = f.read()
-
-            tree = ast.parse(content)
-
-            # Extract imports
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for alias in node.names:
-                        deps = self._resolve_import(alias.name, file_path)
-                        dependencies.update(deps)
-
-                elif isinstance(node, ast.ImportFrom):
-                    if node.module:
-                        if node.level > 0:  # Relative import
-                            deps = self._resolve_relative_import(node.module, node.level, file_path)
-                        else:  # Absolute import
-                            deps = self._resolve_import(node.module, file_path)
-                        dependencies.update(deps)
-                    elif node.level > 0:  # from . import something
-                        deps = self._resolve_relative_import("", node.level, file_path)
-                        dependencies.update(deps)
-
-                # Also check for dynamic imports
-                elif isinstance(node, ast.Call):
-                    if isinstance(node.func, ast.Name) and node.func.id in ["__import__", "importlib.import_module"]:
-                        # Handle dynamic imports if needed
-                        pass
+            with open(self._cache_dir / CACHE_FILE_NAME, "rb") as f:
+                payload = pickle.load(f)
+            if payload["version"] != CACHE_VERSION or payload["scan_nested"] != _scan_nested_enabled():
+                return {}
+            indptr = payload["import_indptr"]
+            modules = payload["import_modules"]
+            levels = payload["import_levels"]
+            cache: Dict[str, tuple] = {}
+            for i, py_file in enumerate(payload["files"]):
+                start, end = indptr[i], indptr[i + 1]
+                imports = {(modules[j], levels[j]) for j in range(start, end)}
+                cache[py_file] = (payload["mtimes"][i], payload["sizes"][i], imports)
+            return cache
+        except Exception:
+            # A missing or corrupt cache just means a cold run
+            return {}
+
+    def _store_import_cache(self, results: List[tuple], file_states: Dict[str, tuple]):
+        """Atomically persist all raw imports as one structure-of-arrays file."""
+        files: List[str] = []
+        mtimes: List[int] = []
+        sizes: List[int] = []
+        import_indptr: List[int] = [0]
+        import_modules: List[str] = []
+        import_levels: List[int] = []
+
+        for py_file, raw_imports in results:
+            state = file_states.get(py_file)
+            if state is None:  # stat failed; let it miss again next run
+                continue
+            files.append(py_file)
+            mtimes.append(state[0])
+            sizes.append(state[1])
+            for module_name, level in raw_imports:
+                import_modules.append(module_name)
+                import_levels.append(level)
+            import_indptr.append(len(import_modules))
+
+        payload = {
+            "version": CACHE_VERSION,
+            "scan_nested": _scan_nested_enabled(),
+            "files": files,
+            "mtimes": mtimes,
+            "sizes": sizes,
+            "import_indptr": import_indptr,
+            "import_modules": import_modules,
+            "import_levels": import_levels,
+        }
 
-        except Exception as e:
-            print(f"Warning: Could not parse {file_path}: {e}")
+        try:
+            self._cache_dir.mkdir(exist_ok=True)
+            cache_file = self._cache_dir / CACHE_FILE_NAME
+            tmp_file = cache_file.with_suffix(f".tmp{os.getpid()}")
+            with open(tmp_file, "wb") as f:
+                pickle.dump(payload, f)
+            os.replace(tmp_file, cache_file)
+        except Exception:
+            # Caching is best-effort; never fail the analysis over it
+            pass
 
+    def _resolve_raw_imports(self, rel_path: str, raw_imports: Set[tuple]) -> Set[int]:
+        """Resolve a file's raw (module, level) imports to project file ids."""
+        dependencies = set()
+        for module_name, level in raw_imports:
+            if level > 0:  # Relative import
+                dependencies.update(self._resolve_relative_import(module_name, level, rel_path))
+            else:  # Absolute import
+                dependencies.update(self._resolve_import(module_name))
         return dependencies
 
-    def _resolve_import(self, module_name: str, from_file: Path) -> Set[str]:
-        """Resolve an absolute import to file paths."""
+    def _resolve_import(self, module_name: str) -> FrozenSet[int]:
+        """Resolve an absolute import to file ids.
+
+        Resolution depends only on the module name and the (immutable after
+        scan) file index, so results are memoized per instance in __init__.
+        """
         resolved = set()
-        parts = module_name.split(".")
+        parts = tuple(module_name.split("."))
 
         # Check if it's a standard library or third-party module
         if self._is_external_module(parts[0]):
-            return resolved
+            return frozenset()
 
-        # Try different combinations
+        # Try different combinations, longest prefix first
         for i in range(len(parts), 0, -1):
-            module_parts = parts[:i]
+            prefix = parts[:i]
 
             # Try as a module file
-            module_path = "/".join(module_parts) + ".py"
-            if module_path in self._python_files:
-                resolved.add(module_path)
+            module_id = self._file_by_module.get(prefix)
+            if module_id is not None:
+                resolved.add(module_id)
 
             # Try as a package
-            init_path = "/".join(module_parts) + "/__init__.py"
-            if init_path in self._python_files:
-                resolved.add(init_path)
+            init_id = self._pkg_by_module.get(prefix)
+            if init_id is not None:
+                resolved.add(init_id)
 
                 # If we're importing from a package, include all specified submodules
                 if i < len(parts):
-                    submodule_path = "/".join(parts[: i + 1]) + ".py"
-                    if submodule_path in self._python_files:
-                        resolved.add(submodule_path)
+                    submodule_id = self._file_by_module.get(parts[: i + 1])
+                    if submodule_id is not None:
+                        resolved.add(submodule_id)
 
-        return resolved
+        return frozenset(resolved)
 
-    def _resolve_relative_import(self, module_name: str, level: int, from_file: Path) -> Set[str]:
-        """Resolve relative imports."""
+    def _resolve_relative_import(self, module_name: str, level: int, from_file: str) -> Set[int]:
+        """Resolve relative imports to file ids."""
         resolved = set()
 
-        # Get the package containing from_file
-        current_path = from_file.parent
-
-        # Go up 'level' directories
-        for _ in range(level - 1):
-            current_path = current_path.parent
+        # Drop the module stem plus level-1 packages to find the base package
+        # (pure tuple slicing; no Path objects or string joins)
+        base = self._file_parts[from_file][:-level]
 
         if module_name:
             # from ..module import something
-            target_path = current_path / module_name.replace(".", "/")
+            target = base + tuple(module_name.split("."))
 
             # Check for module.py
-            module_file = str(target_path) + ".py"
-            if module_file in self._python_files:
-                resolved.add(module_file)
+            module_id = self._file_by_module.get(target)
+            if module_id is not None:
+                resolved.add(module_id)
 
             # Check for module/__init__.py
-            init_file = str(target_path / "__init__.py")
-            if init_file in self._python_files:
-                resolved.add(init_file)
+            init_id = self._pkg_by_module.get(target)
+            if init_id is not None:
+                resolved.add(init_id)
         else:
             # from .. import something
-            init_file = str(current_path / "__init__.py")
-            if init_file in self._python_files:
-                resolved.add(init_file)
+            init_id = self._pkg_by_module.get(base)
+            if init_id is not None:
+                resolved.add(init_id)
 
         return resolved
 
     def _is_external_module(self, module_name: str) -> bool:
         """Check if a module is external (stdlib or third-party)."""
-        # Use sys.stdlib_module_names to check for standard library modules (Python 3.10+)
-        if module_name in sys.stdlib_module_names:
+        if module_name in STDLIB_MODULES:
             return True
 
         # Check if it's an installed third-party package
         if module_name.lower() in self._installed_packages:
             return True
 
-        # Check if it's a file in our project
-        if any(f.startswith(module_name) for f in self._python_files):
-            return False
-
-        # Assume it's external if not found in project
-        return True
+        # Assume it's external if it's not a top-level module in our project
+        return module_name not in self._top_level_project_modules
 
     def _map_tests_to_modules(self):
         """Map test files to the modules they test."""
-        test_files = [f for f in self._python_files if self._is_test_file(f)]
-
-        for test_file in test_files:
+        for test_file in self._test_files:
+            test_id = self._ids[test_file]
             # Get all dependencies of this test file (recursively)
             all_deps = self._get_all_dependencies(test_file)
 
-            for dep in all_deps:
-                if not self._is_test_file(dep):
-                    self.module_to_tests[dep].add(test_file)
+            if np is not None:
+                module_ids = np.setdiff1d(all_deps, self._test_ids_array, assume_unique=True).tolist()
+            else:
+                module_ids = all_deps - self._test_ids
+            for dep in module_ids:
+                self.module_to_tests[dep].add(test_id)
 
     def _is_test_file(self, file_path: str) -> bool:
         """Check if a file is a test file."""
-        return "test_" in file_path or "_test.py" in file_path or "/tests/" in file_path or "/test/" in file_path
-
-    def _get_all_dependencies(self, file_path: str, visited: Set[str] = None) -> Set[str]:
-        """Recursively get all dependencies of a file."""
-        if visited is None:
-            visited = set()
-
-        if file_path in visited:
-            return set()
-
-        visited.add(file_path)
-        all_deps = set()
-
-        # Get direct dependencies
-        direct_deps = self.dependency_graph.get(file_path, set())
-        all_deps.update(direct_deps)
-
-        # Recursively get dependencies of dependencies
-        for dep in direct_deps:
-            all_deps.update(self._get_all_dependencies(dep, visited))
-
-        return all_deps
-
-    def _get_all_dependents(self, file_path: str, visited: Set[str] = None) -> Set[str]:
-        """Recursively get all files that depend on this file."""
-        if visited is None:
-            visited = set()
-
-        if file_path in visited:
-            return set()
-
-        visited.add(file_path)
-        all_dependents = set()
-
-        # Get direct dependents
-        direct_dependents = self.reverse_graph.get(file_path, set())
-        all_dependents.update(direct_dependents)
-
-        # Recursively get dependents of dependents
-        for dep in direct_dependents:
-            all_dependents.update(self._get_all_dependents(dep, visited))
-
-        return all_dependents
+        return _TEST_FILE_RE.search(file_path) is not None
+
+    def _compute_sccs(self):
+        """Condense the dependency graph into strongly connected components.
+
+        Import cycles collapse into a single component; every file in a
+        component shares the same closures. Detection runs through scipy's C
+        kernel over the CSR arrays when available, otherwise through the
+        pure-Python Tarjan pass.
+        """
+        if np is not None and csr_matrix is not None:
+            self._compute_sccs_scipy()
+        else:
+            self._compute_sccs_tarjan()
+        self._build_scc_edges()
+        if self._scc_order is None:
+            # scipy's labels carry no order guarantee; derive one via Kahn
+            self._scc_order = self._reverse_topological_order()
+
+    def _compute_sccs_scipy(self):
+        """Detect components with scipy's C implementation over the CSR arrays."""
+        node_count = len(self._names)
+        graph = csr_matrix(
+            (np.ones(len(self._dep_indices), dtype=np.int8), self._dep_indices, self._dep_indptr),
+            shape=(node_count, node_count),
+        )
+        component_count, labels = connected_components(graph, directed=True, connection="strong")
+
+        self._scc_of = labels.tolist()
+        self._scc_members = [[] for _ in range(component_count)]
+        for node, scc_id in enumerate(self._scc_of):
+            self._scc_members[scc_id].append(node)
+        # A component reaches itself if it has >1 member or a self-import
+        self._scc_cyclic = [
+            len(members) > 1 or members[0] in self.dependency_graph.get(members[0], ())
+            for members in self._scc_members
+        ]
+        self._scc_order = None
+
+    def _compute_sccs_tarjan(self):
+        """Detect components with an iterative Tarjan's algorithm.
+
+        Since nodes are dense int ids, the bookkeeping lives in flat lists.
+        Components are emitted in reverse topological order, which doubles as
+        the closure sweep order.
+        """
+        node_count = len(self._names)
+        index_of = [-1] * node_count
+        lowlink = [0] * node_count
+        on_stack = [False] * node_count
+        scc_stack: List[int] = []
+        counter = 0
+
+        self._scc_of = [-1] * node_count
+        self._scc_members: List[List[int]] = []
+        self._scc_cyclic: List[bool] = []
+
+        for root in range(node_count):
+            if index_of[root] != -1:
+                continue
+            index_of[root] = lowlink[root] = counter
+            counter += 1
+            scc_stack.append(root)
+            on_stack[root] = True
+            work = [(root, iter(self.dependency_graph.get(root, ())))]
+            while work:
+                node, children = work[-1]
+                descended = False
+                for child in children:
+                    if index_of[child] == -1:
+                        index_of[child] = lowlink[child] = counter
+                        counter += 1
+                        scc_stack.append(child)
+                        on_stack[child] = True
+                        work.append((child, iter(self.dependency_graph.get(child, ()))))
+                        descended = True
+                        break
+                    if on_stack[child]:
+                        lowlink[node] = min(lowlink[node], index_of[child])
+                if descended:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index_of[node]:
+                    members = []
+                    while True:
+                        member = scc_stack.pop()
+                        on_stack[member] = False
+                        members.append(member)
+                        if member == node:
+                            break
+                    scc_id = len(self._scc_members)
+                    for member in members:
+                        self._scc_of[member] = scc_id
+                    self._scc_members.append(members)
+                    # A component reaches itself if it has >1 member or a self-import
+                    self._scc_cyclic.append(len(members) > 1 or node in self.dependency_graph.get(node, ()))
+
+        self._scc_order = list(range(len(self._scc_members)))
+
+    def _build_scc_edges(self):
+        """Build the edges between components (the condensation is a DAG)."""
+        self._scc_fwd_edges: Dict[int, Set[int]] = defaultdict(set)
+        self._scc_rev_edges: Dict[int, Set[int]] = defaultdict(set)
+        for node, deps in self.dependency_graph.items():
+            source = self._scc_of[node]
+            for dep in deps:
+                target = self._scc_of[dep]
+                if target != source:
+                    self._scc_fwd_edges[source].add(target)
+                    self._scc_rev_edges[target].add(source)
+
+        # Per-component member arrays for the numpy closure representation
+        if np is not None:
+            self._scc_member_arrays = [np.array(members, dtype=np.int32) for members in self._scc_members]
+
+    def _reverse_topological_order(self) -> List[int]:
+        """Order components so every successor precedes its predecessors."""
+        out_degree = [len(self._scc_fwd_edges.get(scc_id, ())) for scc_id in range(len(self._scc_members))]
+        ready = [scc_id for scc_id, degree in enumerate(out_degree) if degree == 0]
+        order: List[int] = []
+        while ready:
+            scc_id = ready.pop()
+            order.append(scc_id)
+            for predecessor in self._scc_rev_edges.get(scc_id, ()):
+                out_degree[predecessor] -= 1
+                if out_degree[predecessor] == 0:
+                    ready.append(predecessor)
+        return order
+
+    def _compute_forward_closures(self):
+        """Compute every component's forward closure in one global sweep.
+
+        self._scc_order is reverse topological — a component appears only
+        after everything it can reach — so one pass in that order finds each
+        component's successors already resolved. This replaces one DFS per
+        test file with a single sweep; the rarely-needed reverse closures
+        stay lazy.
+        """
+        for scc_id in self._scc_order:
+            if np is not None:
+                self._scc_fwd_closure[scc_id] = self._union_closure(scc_id, self._scc_fwd_edges, self._scc_fwd_closure)
+                continue
+            closure: Set[int] = set()
+            if self._scc_cyclic[scc_id]:
+                closure.update(self._scc_members[scc_id])
+            for successor in self._scc_fwd_edges.get(scc_id, ()):
+                closure.update(self._scc_members[successor])
+                closure.update(self._scc_fwd_closure[successor])
+            self._scc_fwd_closure[scc_id] = frozenset(closure)
+
+    def _union_closure(self, scc_id: int, edges: Dict[int, Set[int]], cache: Dict[int, FrozenSet[int]]):
+        """Union a component's closure as a sorted unique int32 array.
+
+        One concatenate + unique is a k-way np.union1d: a C-level merge over
+        all successor closures instead of repeated Python-set unions. Every
+        successor's closure must already be in the cache.
+        """
+        parts = []
+        if self._scc_cyclic[scc_id]:
+            parts.append(self._scc_member_arrays[scc_id])
+        for successor in edges.get(scc_id, ()):
+            parts.append(self._scc_member_arrays[successor])
+            parts.append(cache[successor])
+        if not parts:
+            return self._empty_closure
+        return np.unique(np.concatenate(parts))
+
+    def _scc_closure(self, scc_id: int, edges: Dict[int, Set[int]], cache: Dict[int, FrozenSet[int]]) -> FrozenSet[int]:
+        """Compute the closure of a component over the condensation DAG.
+
+        Iterative post-order walk: a component's closure is the union of its
+        successors' members and closures, plus its own members if it is cyclic.
+        Completed closures are cached so repeated queries are O(1).
+        """
+        stack = [(scc_id, False)]
+        while stack:
+            current, ready = stack.pop()
+            if current in cache:
+                continue
+            if ready:
+                if np is not None:
+                    cache[current] = self._union_closure(current, edges, cache)
+                    continue
+                closure: Set[int] = set()
+                if self._scc_cyclic[current]:
+                    closure.update(self._scc_members[current])
+                for successor in edges.get(current, ()):
+                    closure.update(self._scc_members[successor])
+                    closure.update(cache[successor])
+                cache[current] = frozenset(closure)
+            else:
+                stack.append((current, True))
+                for successor in edges.get(current, ()):
+                    if successor not in cache:
+                        stack.append((successor, False))
+        return cache[scc_id]
+
+    def _closure(
+        self,
+        file_path: str,
+        edges: Dict[int, Set[int]],
+        scc_cache: Dict[int, FrozenSet[int]],
+        node_cache: Dict[int, FrozenSet[int]],
+    ) -> FrozenSet[int]:
+        """Look up (or compute and memoize) a file's transitive closure."""
+        file_id = self._ids.get(file_path)
+        if file_id is None:
+            return self._empty_closure
+        cached = node_cache.get(file_id)
+        if cached is not None:
+            return cached
+        scc_id = self._scc_of[file_id]
+        closure = self._scc_closure(scc_id, edges, scc_cache)
+        for member in self._scc_members[scc_id]:
+            node_cache[member] = closure
+        return closure
+
+    def _get_all_dependencies(self, file_path: str) -> FrozenSet[int]:
+        """Get ids of all dependencies of a file (transitively, memoized)."""
+        return self._closure(file_path, self._scc_fwd_edges, self._scc_fwd_closure, self._fwd_closure)
+
+    def _get_all_dependents(self, file_path: str) -> FrozenSet[int]:
+        """Get ids of all files that depend on this file (transitively, memoized)."""
+        return self._closure(file_path, self._scc_rev_edges, self._scc_rev_closure, self._rev_closure)
 
     def get_affected_tests(self, changed_files: List[str]) -> Set[str]:
         """Get all tests affected by the changed files."""
         affected_tests = set()
+        affected_ids: Set[int] = set()
 
         for changed_file in changed_files:
-            # If it's a test file itself, include it
+            # If it's a test file itself, include it (changed files may fall
+            # outside the scanned set, so use the predicate here)
             if self._is_test_file(changed_file):
                 affected_tests.add(changed_file)
 
             # Get all files that depend on this changed file (transitively)
             all_dependents = self._get_all_dependents(changed_file)
 
-            # Filter for test files
-            test_dependents = {f for f in all_dependents if self._is_test_file(f)}
-            affected_tests.update(test_dependents)
+            # Filter for test files with a C-level set intersection
+            if np is not None:
+                affected_ids.update(np.intersect1d(all_dependents, self._test_ids_array, assume_unique=True).tolist())
+            else:
+                affected_ids.update(all_dependents & self._test_ids)
 
             # Also check module_to_tests mapping
-            if changed_file in self.module_to_tests:
-                affected_tests.update(self.module_to_tests[changed_file])
+            file_id = self._ids.get(changed_file)
+            if file_id is not None and file_id in self.module_to_tests:
+                affected_ids.update(self.module_to_tests[file_id])
 
+        affected_tests.update(self._names[test_id] for test_id in affected_ids)
         return affected_tests
 
     def print_dependency_info(self, changed_files: List[str]):
@@ -261,25 +868,81 @@ class FullDependencyAnalyzer:
         print("\n=== Dependency Analysis ===")
         for changed_file in changed_files:
             print(f"\nChanged file: {changed_file}")
+            file_id = self._ids.get(changed_file)
+            if file_id is None:
+                continue
 
             # Show what this file depends on
-            deps = self.dependency_graph.get(changed_file, set())
+            deps = {self._names[dep] for dep in self.dependency_graph.get(file_id, ())}
             if deps:
                 print(f"  Dependencies: {deps}")
 
             # Show what depends on this file
-            dependents = self._get_all_dependents(changed_file)
+            dependents = {self._names[dep] for dep in self._get_all_dependents(changed_file)}
             if dependents:
                 print(f"  Files that depend on this: {dependents}")
 
             # Show affected tests
-            tests = self.module_to_tests.get(changed_file, set())
+            tests = {self._names[test_id] for test_id in self.module_to_tests.get(file_id, ())}
             if tests:
                 print(f"  Direct test coverage: {tests}")
 
 
-def get_changed_files() -> List[str]:
-    """Get list of changed Python files in the PR."""
+def collapse_test_args(sorted_tests: List[str], all_test_files: Set[str]) -> List[str]:
+    """Collapse near-complete directory groups of tests into directory paths.
+
+    Thousands of individual test paths bloat the pytest argv (execve copies
+    every argument and can hit E2BIG). When the selection covers at least
+    ARGV_COLLAPSE_THRESHOLD of the known test files under one top-level
+    directory, pass the directory and let pytest collect it; the few tests
+    the closure missed there are a superset worth running for a bounded argv.
+    """
+    selected_by_dir: Dict[str, List[str]] = defaultdict(list)
+    args: List[str] = []
+    for test in sorted_tests:
+        if "/" in test:
+            selected_by_dir[test.split("/", 1)[0]].append(test)
+        else:
+            args.append(test)
+
+    known_by_dir: Dict[str, int] = defaultdict(int)
+    for test in all_test_files:
+        if "/" in test:
+            known_by_dir[test.split("/", 1)[0]] += 1
+
+    for top, selected in selected_by_dir.items():
+        known = known_by_dir[top]
+        if known and len(selected) >= ARGV_COLLAPSE_THRESHOLD * known:
+            args.append(top)
+        else:
+            args.extend(selected)
+
+    return sorted(args)
+
+
+def _get_changed_files_pygit2() -> List[str]:
+    """Diff against origin/main in-process via libgit2 (no fork/exec)."""
+    repo = pygit2.Repository(os.getcwd())
+    head = repo.revparse_single("HEAD")
+    base = repo.revparse_single("origin/main")
+
+    if os.environ.get("GITHUB_EVENT_NAME") == "pull_request":
+        # Mirror `git diff origin/main...HEAD`: diff from the merge base
+        merge_base = repo.merge_base(base.id, head.id)
+        diff = repo.diff(repo[merge_base], head)
+        return [delta.new_file.path for delta in diff.deltas]
+
+    # Mirror `git diff origin/main`: git folds the index into its worktree
+    # diff, but libgit2's one-argument diff skips it, dropping newly added
+    # files that are staged but not committed. Union the tree-to-index and
+    # tree-to-workdir diffs to match what git reports.
+    changed = {delta.new_file.path for delta in repo.diff(base, cached=True).deltas}
+    changed.update(delta.new_file.path for delta in repo.diff(base).deltas)
+    return sorted(changed)
+
+
+def _get_changed_files_subprocess() -> List[str]:
+    """Diff against origin/main by shelling out to git."""
     # if os.environ.get("GITHUB_EVENT_NAME") == "pull_request":
     #     base_ref = os.environ.get("GITHUB_BASE_REF", "main")
     #     cmd = f"git diff --name-only origin/{base_ref}...HEAD"
@@ -297,7 +960,20 @@ def get_changed_files() -> List[str]:
         print(f"Git command failed: {result.stderr}")
         return []
 
-    changed_files = result.stdout.strip().split("\n")
+    return result.stdout.strip().split("\n")
+
+
+def get_changed_files() -> List[str]:
+    """Get list of changed Python files in the PR."""
+    if pygit2 is not None:
+        try:
+            changed_files = _get_changed_files_pygit2()
+        except Exception as e:
+            print(f"Warning: pygit2 diff failed ({e}), falling back to git")
+            changed_files = _get_changed_files_subprocess()
+    else:
+        changed_files = _get_changed_files_subprocess()
+
     # Filter for Python files that exist
     return [f for f in changed_files if f.endswith(".py") and os.path.exists(f)]
 
@@ -328,13 +1004,16 @@ def main():
         print("This might indicate missing test coverage.")
         sys.exit(0)
 
-    print(f"\nFound {len(affected_tests)} affected tests:")
-    for test in sorted(affected_tests):
+    sorted_tests = sorted(affected_tests)
+    print(f"\nFound {len(sorted_tests)} affected tests:")
+    for test in sorted_tests:
         print(f"  - {test}")
 
     # Run the tests
     print("\nRunning affected tests...")
-    cmd = ["poetry", "run", "pytest", "-v", "--tb=short", "-n", "auto"] + list(sorted(affected_tests))
+    cmd = ["poetry", "run", "pytest", "-v", "--tb=short", "-n", "auto"] + collapse_test_args(
+        sorted_tests, analyzer._test_files
+    )
 
     try:
         # Set timeout to 25 minutes (GitHub Actions has 30 minute timeout)